@@ -1,33 +1,116 @@
+import asyncio
+import os
+
+import orjson
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 import uvicorn
-from main import agent_executor, parser 
+from main import get_agent_executor, afinalize_response, get_session_history, record_session_turn
+from tools import acached_search
+
+app = FastAPI(default_response_class=ORJSONResponse)
 
-app = FastAPI()
+# Query responses are multi-KB JSON blobs; gzip them when the client
+# accepts it. Small bodies aren't worth the compression overhead.
+app.add_middleware(GZipMiddleware, minimum_size=512)
 
-# Allow CORS for frontend domain
+# Allow CORS for frontend domain. Origin headers never carry a path, so
+# the value must not end in a slash or it will never match.
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["https://dash-ai-williammiras-projects.vercel.app/"],  # Replace "*" with your frontend URL in production
+    allow_origins=["https://dash-ai-williammiras-projects.vercel.app"],
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["POST"],
+    allow_headers=["content-type"],
+    max_age=86400,  # let browsers cache the preflight for a day
 )
 
+# Speculatively warm the search cache while the LLM is still planning:
+# most runs open with a web search close to the raw user query, and a
+# cache hit turns that ~0.5s tool call into a lookup. The task is
+# fire-and-forget; a miss just leaves an extra cache entry behind.
+_prefetch_tasks: set = set()
+
+
+async def _prefetch_search(query: str):
+    try:
+        await acached_search(query)
+    except Exception:
+        pass  # best-effort warm-up only
+
+
+def speculative_search(user_query: str):
+    task = asyncio.create_task(_prefetch_search(f"{user_query} dataset"))
+    _prefetch_tasks.add(task)
+    task.add_done_callback(_prefetch_tasks.discard)
+
+
 @app.post("/query")
 async def query_agent(request: Request):
     data = await request.json()
     user_query = data.get("query")
+    session_id = data.get("session_id")
     if not user_query:
         return JSONResponse({"error": "No query provided"}, status_code=400)
-    raw_response = agent_executor.invoke({"query": user_query})
+    speculative_search(user_query)
+    raw_response = await get_agent_executor().ainvoke(
+        {"query": user_query, "chat_history": get_session_history(session_id)}
+    )
     try:
-        structured_response = parser.parse(raw_response["output"])
-        return structured_response.dict()
+        structured_response = await afinalize_response(user_query, raw_response["output"])
+        record_session_turn(session_id, user_query, structured_response.summary)
+        return ORJSONResponse(structured_response.model_dump(mode="json"))
     except Exception as e:
         return JSONResponse({"error": str(e), "raw": raw_response["output"]}, status_code=500)
 
+@app.post("/query/stream")
+async def query_agent_stream(request: Request):
+    """Stream agent output as Server-Sent Events.
+
+    Emits `token` events as the model generates, then a final
+    `structured_response` event with the parsed JSON once the run ends,
+    so the client sees text at first-token latency instead of waiting
+    for the whole run.
+    """
+    data = await request.json()
+    user_query = data.get("query")
+    session_id = data.get("session_id")
+    if not user_query:
+        return JSONResponse({"error": "No query provided"}, status_code=400)
+    speculative_search(user_query)
+
+    async def event_stream():
+        output = ""
+        async for event in get_agent_executor().astream_events(
+            {"query": user_query, "chat_history": get_session_history(session_id)},
+            version="v2",
+        ):
+            if event["event"] == "on_chat_model_stream":
+                content = event["data"]["chunk"].content
+                if content:
+                    payload = orjson.dumps({"content": content}).decode()
+                    yield f"event: token\ndata: {payload}\n\n"
+            elif event["event"] == "on_chain_end" and event.get("name") == "AgentExecutor":
+                output = event["data"]["output"]["output"]
+        try:
+            structured_response = await afinalize_response(user_query, output)
+            record_session_turn(session_id, user_query, structured_response.summary)
+            yield f"event: structured_response\ndata: {structured_response.model_dump_json()}\n\n"
+        except Exception as e:
+            payload = orjson.dumps({"error": str(e), "raw": output}).decode()
+            yield f"event: error\ndata: {payload}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 # For local testing
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
+    uvicorn.run(
+        "api:app",
+        host="0.0.0.0",
+        port=8080,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 2)),
+    )
\ No newline at end of file
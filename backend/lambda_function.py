@@ -1,46 +1,54 @@
-from main import agent_executor, parser
-import json
+from main import get_agent_executor, finalize_response, get_session_history, record_session_turn
+import logging
+import os
+
+import orjson
+
+# Every print used to ship the full event through CloudWatch on each
+# invocation; keep debug detail opt-in via LOG_LEVEL instead.
+logger = logging.getLogger(__name__)
+logger.setLevel(os.environ.get("LOG_LEVEL", "WARNING"))
 
 def lambda_handler(event, context):
     try:
-        print("Received event:", event)  # Debug: log the incoming event
-
         body = event.get('body')
         # Handle both string and dict cases for body
         if isinstance(body, str):
             try:
-                body = json.loads(body)
+                body = orjson.loads(body)
             except Exception as e:
-                print("Error parsing body as JSON:", e)
+                logger.debug("Error parsing body as JSON: %s", e)
                 body = {}
         elif isinstance(body, dict):
             pass  # Already a dict
         else:
             body = {}
 
-        print("Parsed body:", body)  # Debug: log the parsed body
-
         query = body.get('query', '')
-        print("Query received:", query)  # Debug: log the query
+        session_id = body.get('session_id')
+        logger.debug("Parsed body with %d fields, query length %d", len(body), len(query))
 
-        raw_response = agent_executor.invoke({"query": query})
-        structured_response = parser.parse(raw_response["output"])
+        raw_response = get_agent_executor().invoke(
+            {"query": query, "chat_history": get_session_history(session_id)}
+        )
+        structured_response = finalize_response(query, raw_response["output"])
+        record_session_turn(session_id, query, structured_response.summary)
 
         # Return the structured response as a top-level JSON object (not stringified)
         return {
             "statusCode": 200,
-            "body": structured_response.json(),  # Pydantic's .json() returns a JSON string
+            "body": structured_response.model_dump_json(),  # JSON string straight from the Rust serializer
             "headers": {"Content-Type": "application/json"}
         }
 
     except Exception as e:
-        print("Exception:", e)  # Debug: log the exception
+        logger.exception("Error while handling query")
         return {
             "statusCode": 500,
-            "body": json.dumps({
+            "body": orjson.dumps({
                 "error": str(e),
                 "message": "An error occurred while processing your request."
-            }),
+            }).decode(),  # Lambda's body must be a str
             "headers": {"Content-Type": "application/json"}
         }
 
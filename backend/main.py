@@ -1,26 +1,56 @@
 # This code is part of the DASH (Data and Analysis Scout Hub) project.
+import functools
 import os
+import re
+from collections import OrderedDict
 #from fastapi import FastAPI
 from pydantic import BaseModel
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser
-from langchain.agents import AgentExecutor, create_tool_calling_agent
-#from langchain.memory import ConversationBufferMemory
-#from langchain.memory import ChatMessageHistory
-from tools import search_tool
 
+# Conversation memory, keyed per session id so a warm Lambda container
+# never mixes conversations between users. Only the last few turns are
+# kept per session and old sessions are evicted LRU-style, so neither
+# the prompt nor the container grows unbounded.
+_SESSION_MAXSIZE = 128
+_HISTORY_WINDOW = 5
+# Prompt tokens dominate LLM wall time, so cap the rendered history by
+# size as well as turn count (~4 chars per token, so roughly 800 tokens).
+_HISTORY_MAX_CHARS = 3200
+_session_histories: OrderedDict[str, list[tuple[str, str]]] = OrderedDict()
 
-openai_api_key = os.environ["OPENAI_API_KEY"]
-langsmith_api_key = os.environ["LANGSMITH_API_KEY"]
-langsmith_endpoint = os.environ["LANGSMITH_ENDPOINT"]
-langsmith_project = os.environ["LANGSMITH_PROJECT"]
-langsmith_tracing = os.environ["LANGSMITH_TRACING"]
-serpapi_api_key = os.environ["SERPAPI_API_KEY"]
 
-#Define the memory for the agent
-#chat_history = ChatMessageHistory()
-#memory = ConversationBufferMemory(chat_memory=chat_history, return_messages=True)
+def get_session_history(session_id):
+    """Return the recent turns for a session as prompt-ready text.
+
+    Newest turns win: older turns are dropped once the rendered history
+    would exceed the character budget.
+    """
+    if not session_id or session_id not in _session_histories:
+        return ""
+    _session_histories.move_to_end(session_id)
+    rendered = []
+    total = 0
+    for q, a in reversed(_session_histories[session_id]):
+        turn = f"User: {q}\nDASH: {a}"
+        total += len(turn)
+        if rendered and total > _HISTORY_MAX_CHARS:
+            break
+        rendered.append(turn)
+    return "\n".join(reversed(rendered))
+
+
+def record_session_turn(session_id, query, answer):
+    """Append a completed turn to a session, evicting old state as needed."""
+    if not session_id:
+        return
+    turns = _session_histories.setdefault(session_id, [])
+    turns.append((query, answer))
+    del turns[:-_HISTORY_WINDOW]
+    _session_histories.move_to_end(session_id)
+    if len(_session_histories) > _SESSION_MAXSIZE:
+        _session_histories.popitem(last=False)
+
 
 class DataQuery(BaseModel):
     #title: str
@@ -30,12 +60,44 @@ class DataQuery(BaseModel):
     tools_used: list[str]
 
 
-llm = ChatOpenAI(model="gpt-4o", temperature=0.0)
-
+# Shared by api.py and lambda_function.py.
 parser = PydanticOutputParser(pydantic_object=DataQuery)
 
-prompt = ChatPromptTemplate.from_template(
+# parser.get_format_instructions() would inline the full auto-generated
+# JSON Schema (titles, types, per-field definitions) — hundreds of
+# prompt tokens re-sent on every LLM turn. This hand-written shape
+# carries the same information in one line.
+FORMAT_INSTRUCTIONS = (
+    'Return a JSON object exactly matching this shape: '
+    '{"summary": str, "relevancyExplained": str, "sources": [str], "tools_used": [str]}'
+)
+
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", re.MULTILINE)
+
+
+def parse_output(raw):
+    """Parse the agent's final output into a DataQuery.
+
+    Fast path for the common case of clean JSON (possibly wrapped in
+    code fences): strip the fences and validate in one call through
+    Pydantic's Rust core. Fall back to the LangChain parser's
+    regex-based extraction only when that fails.
     """
+    try:
+        return DataQuery.model_validate_json(_FENCE_RE.sub("", raw).strip())
+    except Exception:
+        return parser.parse(raw)
+
+@functools.lru_cache(maxsize=1)
+def get_prompt():
+    """Compile the agent prompt template once per process.
+
+    Template parsing and the .partial() binding only ever run on the
+    first call; with gunicorn --preload the compiled template is shared
+    with workers copy-on-write.
+    """
+    return ChatPromptTemplate.from_template(
+        """
     You are a highly knowledgeable and helpful AI assistant that specializes in finding publicly available datasets
     for data science and machine learning projects.
 
@@ -57,6 +119,9 @@ prompt = ChatPromptTemplate.from_template(
     If the user's request does not relate to datasets, politely inform them that you can only assist with dataset-related queries.
     If the user's request is not clear on waht dataset they need, ask clarifying questions to better understand their needs.
 
+    Previous conversation with this user (may be empty):
+    {chat_history}
+
     User Query:
     {query}
 
@@ -65,31 +130,122 @@ prompt = ChatPromptTemplate.from_template(
 
     {agent_scratchpad}
     """
-).partial(format_instructions=parser.get_format_instructions())
+    ).partial(format_instructions=FORMAT_INSTRUCTIONS)
 
-# Create the agent with the search tool and the prompt
-agent = create_tool_calling_agent(
-    llm=llm,
-    tools=[search_tool],
-    prompt=prompt,
-)
+# Deciding which tool to call is a small classification-like step that
+# the mini model handles at a fraction of the latency and cost; the
+# large model is spent once on the final write-up instead of on every
+# agent turn.
+PLANNER_MODEL = os.environ.get("PLANNER_MODEL", "gpt-4o-mini")
+WRITER_MODEL = os.environ.get("WRITER_MODEL", "gpt-4o")
+
+
+@functools.lru_cache(maxsize=1)
+def _get_http_clients():
+    """Pooled keep-alive HTTP clients shared by both LLMs.
+
+    One sync and one async client means every LLM call reuses the TLS
+    session instead of renegotiating it, and HTTP/2 multiplexes
+    parallel tool-call turns on one connection.
+    """
+    import httpx
+
+    limits = httpx.Limits(max_keepalive_connections=100, max_connections=200)
+    return (
+        httpx.Client(limits=limits, http2=True, timeout=30),
+        httpx.AsyncClient(limits=limits, http2=True, timeout=30),
+    )
+
+
+def _build_llm(model):
+    from langchain_openai import ChatOpenAI
+
+    if "OPENAI_API_KEY" not in os.environ:
+        raise RuntimeError("OPENAI_API_KEY is not set")
+
+    http_client, http_async_client = _get_http_clients()
+    return ChatOpenAI(
+        model=model,
+        temperature=0.0,
+        http_client=http_client,
+        http_async_client=http_async_client,
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def get_agent_executor():
+    """Build the agent executor on first use and reuse it afterwards.
+
+    The LangChain/OpenAI imports and client construction are deferred to
+    here so importing this module (e.g. during a Lambda cold start, or
+    by code that only needs the parser) stays cheap, and a missing API
+    key surfaces when the agent is first used rather than at import.
+    """
+    from langchain.agents import AgentExecutor, create_tool_calling_agent
+
+    from tools import search_tool
+
+    # Create the agent with the search tool and the prompt
+    agent = create_tool_calling_agent(
+        llm=_build_llm(PLANNER_MODEL),
+        tools=[search_tool],
+        prompt=get_prompt(),
+    )
+
+    return AgentExecutor(
+        agent=agent,
+        tools=[search_tool],
+        # Verbose tracing writes the full intermediate reasoning to stdout
+        # on every request; keep it opt-in.
+        verbose=bool(int(os.environ.get("AGENT_VERBOSE", "0"))),
+        #return_intermediate_steps=True,
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def get_writer_chain():
+    """Chain that rewrites the planner's draft into the final answer."""
+    writer_prompt = ChatPromptTemplate.from_template(
+        """
+    You are DASH, an AI assistant that recommends publicly available datasets
+    for data science and machine learning projects.
+
+    A research assistant has drafted an answer to the user's query from web
+    search results. Rewrite it into the final response: keep every dataset,
+    source URL and tool mentioned, improve the wording, and drop nothing factual.
+
+    User Query:
+    {query}
+
+    Draft answer:
+    {draft}
+
+    {format_instructions}
+    """
+    ).partial(format_instructions=FORMAT_INSTRUCTIONS)
+    return writer_prompt | _build_llm(WRITER_MODEL)
+
+
+def finalize_response(query, draft):
+    """Polish the planner's draft with the writer model and parse it."""
+    final = get_writer_chain().invoke({"query": query, "draft": draft})
+    return parse_output(final.content)
+
+
+async def afinalize_response(query, draft):
+    """Async counterpart of finalize_response."""
+    final = await get_writer_chain().ainvoke({"query": query, "draft": draft})
+    return parse_output(final.content)
 
-agent_executor = AgentExecutor(
-    agent=agent,
-    tools=[search_tool],
-    verbose=True,
-    #memory=memory,
-    #return_intermediate_steps=True,
-)
 
 if __name__ == "__main__":
     print("\n👋 Hi there! I'm your AI dataset scout, but you can call me DASH. Tell me about your project, and I’ll find the best datasets to help you get started.\n")
     query = input("📝 What is your project about, and what kind of data do you need?\n> ")
 
-    raw_response = agent_executor.invoke({"query": query})
+    raw_response = get_agent_executor().invoke({"query": query, "chat_history": ""})
 
     try:
-        structured_response = parser.parse(raw_response["output"])
+        structured_response = finalize_response(query, raw_response["output"])
         print("\n📊 Here's a dataset summary I found:")
         print(structured_response)
     except Exception as e:
@@ -1,4 +1,6 @@
+from collections import OrderedDict
 
+import aiohttp
 from langchain_community.utilities import SerpAPIWrapper
 from langchain_community.tools import Tool
 from dotenv import load_dotenv
@@ -6,8 +8,58 @@ from dotenv import load_dotenv
 load_dotenv()
 
 search = SerpAPIWrapper()
+
+# Without a shared session SerpAPIWrapper.arun opens a fresh TLS
+# connection per call; created lazily because a ClientSession must be
+# built inside a running event loop.
+_aiosession: aiohttp.ClientSession | None = None
+
+
+async def _ensure_aiosession() -> None:
+    global _aiosession
+    if _aiosession is None or _aiosession.closed:
+        _aiosession = aiohttp.ClientSession()
+        search.aiosession = _aiosession
+
+# Dataset-discovery queries repeat heavily ("kaggle image classification",
+# "uci tabular", ...) and each SerpAPI call is a ~0.5s HTTPS round trip,
+# so cache results per process keyed on the query string.
+_CACHE_MAXSIZE = 1024
+_search_cache: OrderedDict[str, str] = OrderedDict()
+
+
+def _cache_put(query: str, result: str) -> str:
+    _search_cache[query] = result
+    if len(_search_cache) > _CACHE_MAXSIZE:
+        _search_cache.popitem(last=False)
+    return result
+
+
+def _cache_get(query: str) -> str | None:
+    if query in _search_cache:
+        _search_cache.move_to_end(query)
+        return _search_cache[query]
+    return None
+
+
+def cached_search(query: str) -> str:
+    cached = _cache_get(query)
+    if cached is not None:
+        return cached
+    return _cache_put(query, search.run(query))
+
+
+async def acached_search(query: str) -> str:
+    cached = _cache_get(query)
+    if cached is not None:
+        return cached
+    await _ensure_aiosession()
+    return _cache_put(query, await search.arun(query))
+
+
 search_tool = Tool(
     name="serpapi_search",
-    func=search.run,
+    func=cached_search,
+    coroutine=acached_search,
     description="A tool to search the web for datasets. Input should be a search query related to datasets, data science, or machine learning."
-)
\ No newline at end of file
+)